@@ -0,0 +1,118 @@
+import random
+from unittest.mock import patch
+
+import pytest
+
+from truffshuff import Barbell, DumbbellPair, GymConfiguration, GymIteration, GymStock, Plate, SOLVER_ENGINES, \
+    REFERENCE_ENGINE, DEFAULT_ENGINE
+
+
+PLATE_2K5 = Plate(2.5, 25)
+PLATE_5KG = Plate(5, 30)
+
+
+@pytest.fixture
+def gym_stock():
+    gym_stock = GymStock(1, 0)
+    gym_stock.weight_dict = {PLATE_2K5: 2, PLATE_5KG: 1}
+    return gym_stock
+
+
+def test_registry():
+    assert REFERENCE_ENGINE in SOLVER_ENGINES
+    assert DEFAULT_ENGINE in SOLVER_ENGINES
+
+
+def test_nth_iteration():
+    gym_iteration = GymIteration({PLATE_2K5: 1, PLATE_5KG: 1}, 1, 0)
+    assert gym_iteration.iteration_cnt() == 9
+    # Heaviest plate first: 5kg on the rhs (digit 1), 2.5kg left off (digit 2).
+    gym_iteration.nth_iteration(1 + 2 * 3)
+    assert gym_iteration.barbells == [Barbell([], [PLATE_5KG])]
+
+
+def test_balances():
+    assert GymConfiguration([Barbell([PLATE_5KG], [PLATE_2K5, PLATE_2K5])]).balances(300, 100)
+    assert not GymConfiguration([Barbell([PLATE_5KG], [PLATE_2K5])]).balances(300, 100)
+    assert not GymConfiguration([Barbell([PLATE_5KG], [PLATE_2K5, PLATE_2K5])]).balances(40, 100)
+    assert not GymConfiguration([], [DumbbellPair([PLATE_5KG], [PLATE_5KG], [PLATE_2K5], [PLATE_2K5])]).balances(
+        300, 100)
+
+
+def test_canonical():
+    configuration = GymConfiguration([Barbell([PLATE_5KG], [PLATE_2K5, PLATE_2K5])])
+    mirrored = GymConfiguration([Barbell([PLATE_2K5, PLATE_2K5], [PLATE_5KG])])
+    assert configuration.canonical() == mirrored.canonical()
+    assert GymConfiguration.from_canonical(configuration.canonical()).canonical() == configuration.canonical()
+    pair = GymConfiguration([], [DumbbellPair([PLATE_5KG], [PLATE_5KG], [PLATE_2K5, PLATE_2K5], [PLATE_2K5, PLATE_2K5])])
+    swapped = GymConfiguration([], [DumbbellPair([PLATE_2K5, PLATE_2K5], [PLATE_2K5, PLATE_2K5], [PLATE_5KG], [PLATE_5KG])])
+    assert pair.canonical() == swapped.canonical()
+
+
+def test_canonical_dumbbell_pairing():
+    plate_1k25 = Plate(1.25, 18)
+    x = ([PLATE_2K5], [PLATE_2K5])
+    y = ([plate_1k25, plate_1k25], [plate_1k25, plate_1k25])
+    alike = GymConfiguration([], [DumbbellPair(*x, *x), DumbbellPair(*y, *y)])
+    mixed = GymConfiguration([], [DumbbellPair(*x, *y), DumbbellPair(*y, *x)])
+    assert alike.balances(300, 100) and mixed.balances(300, 100)
+    assert alike.canonical() == mixed.canonical()
+    assert GymConfiguration.from_canonical(mixed.canonical()).balances(300, 100)
+
+
+def test_from_sides():
+    configuration = GymConfiguration([Barbell([PLATE_5KG], [PLATE_5KG])],
+                                     [DumbbellPair([PLATE_2K5], [PLATE_2K5], [], [PLATE_5KG])])
+    assert GymConfiguration.from_sides(configuration.sides(), 1) == configuration
+
+
+def test_brute_force_engine(gym_stock):
+    gym_stock.engine = REFERENCE_ENGINE
+    assert {configuration.canonical() for configuration in gym_stock.balance_plates()} == {
+        GymConfiguration([Barbell()]).canonical(),
+        GymConfiguration([Barbell([PLATE_2K5], [PLATE_2K5])]).canonical(),
+        GymConfiguration([Barbell([PLATE_5KG], [PLATE_2K5, PLATE_2K5])]).canonical(),
+    }
+
+
+def test_brute_force_engine_thread_len(gym_stock):
+    gym_stock.engine = REFERENCE_ENGINE
+    with patch.object(GymStock, "STD_BARBELL_THREAD_LEN", 30):
+        assert len(gym_stock.balance_plates()) == 2
+
+
+def test_cross_check(gym_stock):
+    assert gym_stock.cross_check(REFERENCE_ENGINE) == (set(), set())
+
+
+def test_cross_check_against_itself(gym_stock):
+    gym_stock.engine = REFERENCE_ENGINE
+    with pytest.raises(ValueError) as e_info:
+        gym_stock.cross_check(REFERENCE_ENGINE)
+
+
+def random_gym_stock(rng: random.Random) -> GymStock:
+    """Small enough for the brute force engine to visit no more than a few thousand iterations."""
+    barbells, dumbbells = rng.choice([(1, 0), (0, 2), (2, 0), (1, 2), (0, 4)])
+    gym_stock = GymStock(barbells, dumbbells)
+    max_plates = {(1, 2): 4, (0, 4): 3}.get((barbells, dumbbells), 5)
+    plates = rng.sample([Plate(1.25, 18), Plate(2.5, 25), Plate(5, 30), Plate(7.5, 35), Plate(10, 40)],
+                        rng.randint(1, 3))
+    for plate in plates:
+        gym_stock.weight_dict[plate] = rng.randint(0, max_plates - sum(gym_stock.weight_dict.values()))
+    return gym_stock
+
+
+@pytest.mark.parametrize("seed", range(25))
+@pytest.mark.parametrize("engine", [name for name in SOLVER_ENGINES if name != REFERENCE_ENGINE])
+def test_engines_agree_with_reference(seed, engine):
+    rng = random.Random(seed)
+    gym_stock = random_gym_stock(rng)
+    gym_stock.engine = engine
+    barbell_thread_len = rng.randint(20, 120)
+    dumbbell_thread_len = rng.randint(20, 80)
+    with patch.object(GymStock, "STD_BARBELL_THREAD_LEN", barbell_thread_len), \
+            patch.object(GymStock, "STD_DUMBBELL_THREAD_LEN", dumbbell_thread_len):
+        assert gym_stock.cross_check(REFERENCE_ENGINE) == (set(), set()), gym_stock.weight_dict
+        assert all(configuration.balances(barbell_thread_len, dumbbell_thread_len)
+                   for configuration in gym_stock.balance_plates())
@@ -0,0 +1,184 @@
+import os
+
+import pytest
+
+from truffshuff import Barbell, DumbbellPair, GymConfiguration, Plate, ResultsReader, write_results, \
+    print_results, RESULTS_HEADER, RESULTS_PLATE
+
+
+PLATE_2K5 = Plate(2.5, 25)
+PLATE_5KG = Plate(5, 30)
+PLATES = [PLATE_2K5, PLATE_5KG]
+
+
+@pytest.fixture
+def configurations():
+    return [
+        GymConfiguration([Barbell([PLATE_5KG], [PLATE_5KG])],
+                         [DumbbellPair([PLATE_2K5], [PLATE_2K5], [PLATE_2K5], [PLATE_2K5])]),
+        GymConfiguration([Barbell([PLATE_5KG, PLATE_2K5], [PLATE_2K5, PLATE_5KG])],
+                         [DumbbellPair()]),
+        GymConfiguration([Barbell([PLATE_2K5, PLATE_2K5], [PLATE_5KG])],
+                         [DumbbellPair([PLATE_2K5], [PLATE_2K5], [PLATE_2K5], [PLATE_2K5])]),
+    ]
+
+
+@pytest.fixture
+def results_file(tmp_path, configurations):
+    path = str(tmp_path / "results.bin")
+    write_results(path, PLATES, 1, 2, configurations)
+    return path
+
+
+def test_fixed_width_records(results_file, configurations):
+    with open(results_file, "rb") as f:
+        data = f.read()
+    # 6 bar ends of 2 plate types each.
+    assert len(data) == RESULTS_HEADER.size + 2 * RESULTS_PLATE.size + len(configurations) * 12
+
+
+def test_read_header(results_file):
+    with ResultsReader(results_file) as reader:
+        assert reader.plate_list == PLATES
+        assert reader.barbell_cnt == 1
+        assert reader.dumbbell_cnt == 2
+        assert len(reader) == 3
+
+
+def test_record(results_file):
+    with ResultsReader(results_file) as reader:
+        record = reader.record(1)
+        assert record.tolist() == [1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0]
+        record.release()
+
+
+def test_record_out_of_range(results_file):
+    with ResultsReader(results_file) as reader:
+        with pytest.raises(IndexError) as e_info:
+            reader.record(3)
+
+
+def test_configuration_round_trip(results_file, configurations):
+    with ResultsReader(results_file) as reader:
+        assert reader.configuration(0) == configurations[0]
+        assert reader.configuration(2) == configurations[2]
+        # Plates on a bar end are recorded as counts, so come back heaviest last.
+        assert reader.configuration(1).barbells[0].lhs == [PLATE_2K5, PLATE_5KG]
+
+
+def test_bar_weight(results_file):
+    with ResultsReader(results_file) as reader:
+        assert reader.bar_weight(0) == 10
+        assert reader.bar_weight(1) == 15
+        assert reader.bar_weight(0, 2) == 5
+        with pytest.raises(IndexError) as e_info:
+            reader.bar_weight(0, 3)
+
+
+def test_filter_by_bar_weight(results_file):
+    with ResultsReader(results_file) as reader:
+        assert list(reader.filter_by_bar_weight(10)) == [0, 2]
+        assert list(reader.filter_by_bar_weight(15)) == [1]
+        assert list(reader.filter_by_bar_weight(0, 1)) == [1]
+        assert list(reader.filter_by_bar_weight(7.5)) == []
+
+
+def test_close_after_partly_consumed_filter(results_file):
+    reader = ResultsReader(results_file)
+    matches = iter(reader.filter_by_bar_weight(10))
+    assert next(matches) == 0
+    reader.close()
+    reader.close()
+    assert list(matches) == [2]
+
+
+def test_filter_by_bar_weight_without_plates(tmp_path):
+    path = str(tmp_path / "results.bin")
+    write_results(path, [], 1, 0, [GymConfiguration([Barbell()])] * 2)
+    with ResultsReader(path) as reader:
+        assert list(reader.filter_by_bar_weight(0)) == [0, 1]
+        assert list(reader.filter_by_bar_weight(5)) == []
+
+
+def test_zero_width_records_counted(tmp_path):
+    path = str(tmp_path / "results.bin")
+    write_results(path, [], 1, 0, [GymConfiguration([Barbell()])] * 2)
+    with ResultsReader(path) as reader:
+        assert len(reader) == 2
+        assert reader.configuration(1) == GymConfiguration([Barbell()])
+    write_results(path, [PLATE_5KG], 0, 0, [GymConfiguration()])
+    with ResultsReader(path) as reader:
+        assert len(reader) == 1
+
+
+def test_write_results_wrong_bar_count(tmp_path, configurations):
+    path = tmp_path / "results.bin"
+    with pytest.raises(ValueError) as e_info:
+        write_results(str(path), PLATES, 1, 0, configurations)
+    assert not path.exists()
+
+
+def test_write_results_thick_plate(tmp_path):
+    path = tmp_path / "results.bin"
+    thick_plate = Plate(1, 70000)
+    with pytest.raises(ValueError) as e_info:
+        write_results(str(path), [thick_plate], 1, 0, [GymConfiguration([Barbell([thick_plate], [thick_plate])])])
+    assert not path.exists()
+
+
+def test_write_results_too_many_bars(tmp_path):
+    path = tmp_path / "results.bin"
+    with pytest.raises(ValueError) as e_info:
+        write_results(str(path), PLATES, 70000, 0, [])
+    assert not path.exists()
+
+
+def test_write_results_odd_dumbbells(tmp_path, configurations):
+    path = tmp_path / "results.bin"
+    with pytest.raises(ValueError) as e_info:
+        write_results(str(path), PLATES, 1, 3, configurations)
+    assert not path.exists()
+
+
+def test_reader_rejects_foreign_file(tmp_path):
+    path = tmp_path / "results.bin"
+    path.write_bytes(RESULTS_HEADER.pack(b"NOPE", 1, 0, 0, 0, 0))
+    with pytest.raises(ValueError) as e_info:
+        ResultsReader(str(path))
+
+
+def test_reader_rejects_truncated_file(results_file):
+    with open(results_file, "ab") as f:
+        f.write(b"\x01")
+    with pytest.raises(ValueError) as e_info:
+        ResultsReader(results_file)
+
+
+def test_reader_rejects_empty_file(tmp_path):
+    path = tmp_path / "results.bin"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError) as e_info:
+        ResultsReader(str(path))
+
+
+def test_reader_rejects_truncated_plate_table(results_file):
+    with open(results_file, "r+b") as f:
+        f.truncate(RESULTS_HEADER.size + RESULTS_PLATE.size + 1)
+    with pytest.raises(ValueError) as e_info:
+        ResultsReader(results_file)
+
+
+def test_reader_rejects_missing_records(results_file):
+    with open(results_file, "r+b") as f:
+        f.truncate(os.path.getsize(results_file) - 12)
+    with pytest.raises(ValueError) as e_info:
+        ResultsReader(results_file)
+
+
+def test_print_results(capsys, configurations):
+    print_results(configurations[:2], 1, 2)
+    assert capsys.readouterr().out.splitlines() == [
+        "barbell1 lhs,barbell1 rhs,dumbbell1 lhs,dumbbell1 rhs,dumbbell2 lhs,dumbbell2 rhs",
+        "5kg*30mm,5kg*30mm,2.5kg*25mm,2.5kg*25mm,2.5kg*25mm,2.5kg*25mm",
+        "5kg*30mm+2.5kg*25mm,2.5kg*25mm+5kg*30mm,,,,",
+    ]
@@ -5,7 +5,7 @@ from unittest.mock import patch, call, sentinel, mock_open, Mock
 import pytest
 
 from truffshuff import parse_args, input_bar_specifier, DEFAULT_PLATES, accept_inventory_file, read_inventory, GymStock, \
-    parse_cmd_line_args
+    parse_cmd_line_args, accept_results_file, accept_engine_options, main
 
 MOCK_JSON = '''
 {
@@ -56,13 +56,16 @@ def test_accept_inventory_file_wout_bars(patched_elicit_bars, patched_read_inven
     assert gym_stock.weight_dict == {sentinel.plate: 2}
 
 
-@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock))
+@patch("truffshuff.print_results")
+@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock, barbells=1, dumbbells=2))
 @patch("truffshuff.accept_inventory_file", return_value=None)
-def test_parse_args(patched_accept_inventory, patched_parse_cmd_line):
+def test_parse_args(patched_accept_inventory, patched_parse_cmd_line, patched_print_results):
     parse_args(sentinel.arg_list)
     patched_accept_inventory.assert_called_once_with(sentinel.arg_list)
     patched_parse_cmd_line.assert_called_once_with(sentinel.arg_list)
     patched_parse_cmd_line.return_value.balance_plates.assert_called_once_with()
+    patched_print_results.assert_called_once_with(
+        patched_parse_cmd_line.return_value.balance_plates.return_value, 1, 2)
 
 
 @patch("builtins.input", side_effect=["1", "2"])
@@ -146,3 +149,78 @@ def test_input_bar_specifier(patched_input):
     assert [0] == input_bar_specifier("xyz", 32)
     assert [1] == input_bar_specifier("xyz", 32)
     assert [4, 120] == input_bar_specifier("xyz", 32)
+
+
+def test_accept_results_file():
+    assert accept_results_file(["-o", "out.bin", "1", "2"]) == ("out.bin", ["1", "2"])
+    assert accept_results_file(["-i", "inv.json", "-o", "out.bin"]) == ("out.bin", ["-i", "inv.json"])
+    assert accept_results_file(["1", "2"]) == (None, ["1", "2"])
+
+
+@patch("truffshuff.write_results")
+@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock, weight_dict={sentinel.plate: 2},
+                                                           barbells=1, dumbbells=2))
+@patch("truffshuff.accept_inventory_file", return_value=None)
+def test_parse_args_results_file(patched_accept_inventory, patched_parse_cmd_line, patched_write_results):
+    parse_args(sentinel.arg_list, sentinel.results_file)
+    gym_stock = patched_parse_cmd_line.return_value
+    patched_write_results.assert_called_once_with(sentinel.results_file, [sentinel.plate], 1, 2,
+                                                  gym_stock.balance_plates.return_value)
+
+
+def test_accept_engine_options():
+    assert accept_engine_options(["--engine", "brute-force", "1", "2"]) == ("brute-force", False, ["1", "2"])
+    assert accept_engine_options(["--cross-check", "1", "2"]) == (None, True, ["1", "2"])
+    assert accept_engine_options(["1", "2"]) == (None, False, ["1", "2"])
+
+
+@patch("truffshuff.show_usage", side_effect=SystemExit)
+def test_accept_engine_options_unknown(patched_show_usage):
+    with pytest.raises(SystemExit) as e_info:
+        accept_engine_options(["--engine", "guesswork"])
+    patched_show_usage.assert_called_once_with()
+
+
+@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock, engine="counts"))
+@patch("truffshuff.accept_inventory_file", return_value=None)
+def test_parse_args_cross_check(patched_accept_inventory, patched_parse_cmd_line):
+    gym_stock = patched_parse_cmd_line.return_value
+    gym_stock.cross_check.return_value = (set(), set())
+    parse_args(sentinel.arg_list, engine="counts", cross_check=True)
+    gym_stock.cross_check.assert_called_once_with("brute-force")
+    gym_stock.balance_plates.assert_not_called()
+
+
+@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock, engine="counts"))
+@patch("truffshuff.accept_inventory_file", return_value=None)
+def test_parse_args_cross_check_disagrees(patched_accept_inventory, patched_parse_cmd_line):
+    gym_stock = patched_parse_cmd_line.return_value
+    gym_stock.cross_check.return_value = ({((), ())}, set())
+    with pytest.raises(SystemExit) as e_info:
+        parse_args(sentinel.arg_list, cross_check=True)
+
+
+@patch("truffshuff.write_results", side_effect=ValueError("Dumbbell count (3) must be even!"))
+@patch("truffshuff.parse_cmd_line_args", return_value=Mock(spec=GymStock, weight_dict={}, barbells=1, dumbbells=3))
+@patch("truffshuff.accept_inventory_file", return_value=None)
+def test_parse_args_results_file_fails(patched_accept_inventory, patched_parse_cmd_line, patched_write_results):
+    with pytest.raises(SystemExit) as e_info:
+        parse_args(sentinel.arg_list, sentinel.results_file)
+    assert str(e_info.value) == "Dumbbell count (3) must be even!"
+
+
+@patch("truffshuff.show_usage", side_effect=SystemExit)
+def test_accept_engine_options_cross_check_reference(patched_show_usage):
+    with pytest.raises(SystemExit) as e_info:
+        accept_engine_options(["--engine", "brute-force", "--cross-check", "1", "2"])
+    patched_show_usage.assert_called_once_with()
+
+
+@patch("truffshuff.parse_args")
+@patch("truffshuff.show_usage", side_effect=SystemExit)
+def test_main_cross_check_with_results_file(patched_show_usage, patched_parse_args):
+    with patch("sys.argv", ["truffshuff.py", "--cross-check", "-o", "out.bin", "1", "2"]):
+        with pytest.raises(SystemExit) as e_info:
+            main()
+    patched_show_usage.assert_called_once_with()
+    patched_parse_args.assert_not_called()
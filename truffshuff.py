@@ -3,14 +3,19 @@
 """
 """
 
+import csv
+import itertools
 import json
+import math
+import mmap
 import os.path
+import struct
 import sys
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional, Set
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, order=True)
 class Plate:
     weight: float
     thickness: int
@@ -44,6 +49,80 @@ class DumbbellPair:
     db2_rhs: List[Plate] = field(default_factory=list)
 
 
+@dataclass
+class GymConfiguration:
+    barbells: List[Barbell] = field(default_factory=list)
+    dumbbell_pairs: List[DumbbellPair] = field(default_factory=list)
+
+    def sides(self) -> List[List[Plate]]:
+        """Every bar end, barbells first, in the order they are recorded in result files."""
+        sides = []
+        for barbell in self.barbells:
+            sides.extend([barbell.lhs, barbell.rhs])
+        for pair in self.dumbbell_pairs:
+            sides.extend([pair.db1_lhs, pair.db1_rhs, pair.db2_lhs, pair.db2_rhs])
+        return sides
+
+    @staticmethod
+    def from_sides(sides: List[List[Plate]], barbell_cnt: int) -> "GymConfiguration":
+        """Reverses sides(), given how many of the bar ends belong to barbells."""
+        barbell_sides = sides[:2 * barbell_cnt]
+        dumbbell_sides = sides[2 * barbell_cnt:]
+        return GymConfiguration(
+            [Barbell(*barbell_sides[i:i + 2]) for i in range(0, len(barbell_sides), 2)],
+            [DumbbellPair(*dumbbell_sides[i:i + 4]) for i in range(0, len(dumbbell_sides), 4)])
+
+    def balances(self, barbell_thread_len: int, dumbbell_thread_len: int) -> bool:
+        """Every bar end fits its thread and weighs the same as its other end,
+        and both dumbbells of a pair weigh the same."""
+        def weight(side):
+            return sum(plate.weight for plate in side)
+
+        def fits(side, thread_len):
+            return sum(plate.thickness for plate in side) <= thread_len
+
+        for barbell in self.barbells:
+            if not (fits(barbell.lhs, barbell_thread_len) and fits(barbell.rhs, barbell_thread_len)):
+                return False
+            if not math.isclose(weight(barbell.lhs), weight(barbell.rhs)):
+                return False
+        for pair in self.dumbbell_pairs:
+            ends = [pair.db1_lhs, pair.db1_rhs, pair.db2_lhs, pair.db2_rhs]
+            if not all(fits(side, dumbbell_thread_len) for side in ends):
+                return False
+            if not all(math.isclose(weight(ends[0]), weight(side)) for side in ends[1:]):
+                return False
+        return True
+
+    def canonical(self) -> Tuple:
+        """Hashable form that is the same for configurations differing only by plate order on
+        an end, which end of a bar is which, which of the interchangeable bars is which,
+        or which dumbbells of the same weight are paired together."""
+        def end(side):
+            return tuple(sorted(side, reverse=True))
+
+        def bar(lhs, rhs):
+            return tuple(sorted([end(lhs), end(rhs)]))
+
+        def weight(dumbbell):
+            return round(sum(plate.weight for side in dumbbell for plate in side), 6)
+
+        barbells = tuple(sorted(bar(barbell.lhs, barbell.rhs) for barbell in self.barbells))
+        # Pairs weigh the same, so re-pairing neighbours after sorting by weight still pairs like with like.
+        dumbbells = sorted((dumbbell for pair in self.dumbbell_pairs
+                            for dumbbell in [bar(pair.db1_lhs, pair.db1_rhs), bar(pair.db2_lhs, pair.db2_rhs)]),
+                           key=lambda dumbbell: (weight(dumbbell), dumbbell))
+        dumbbell_pairs = tuple(zip(dumbbells[::2], dumbbells[1::2]))
+        return barbells, dumbbell_pairs
+
+    @staticmethod
+    def from_canonical(canonical: Tuple) -> "GymConfiguration":
+        barbells, dumbbell_pairs = canonical
+        return GymConfiguration(
+            [Barbell(list(lhs), list(rhs)) for lhs, rhs in barbells],
+            [DumbbellPair(list(db1[0]), list(db1[1]), list(db2[0]), list(db2[1])) for db1, db2 in dumbbell_pairs])
+
+
 class GymIteration:
     def __init__(self, plate_inventory: Dict[Plate, int], barbell_cnt: int, dumbbell_cnt: int):
         self.plate_inventory = plate_inventory
@@ -59,19 +138,46 @@ class GymIteration:
             self.plate_stack.extend([plate] * qty)
         self.plate_stack.sort(key=lambda x: x.weight, reverse=True)
 
+    def side_cnt(self) -> int:
+        return 2 * self.barbell_cnt + 4 * (self.dumbbell_cnt // 2)
+
+    def iteration_cnt(self) -> int:
+        """Each plate in the stack may go on any bar end or be left off."""
+        return (self.side_cnt() + 1) ** sum(self.plate_inventory.values())
+
     def nth_iteration(self, iteration_number):
+        """Reads iteration_number in base (bar ends + 1), one digit per plate in the stack,
+        choosing the end it goes on or leaving it off for the extra digit value."""
         self.barbells = [Barbell() for _ in range(self.barbell_cnt)]
         self.dumbbell_pairs = [DumbbellPair() for _ in range(self.dumbbell_cnt // 2)]
         self.lay_out_plates()
+        sides = self.configuration().sides()
+        for plate in self.plate_stack:
+            iteration_number, destination = divmod(iteration_number, len(sides) + 1)
+            if destination < len(sides):
+                sides[destination].append(plate)
+
+    def configuration(self) -> GymConfiguration:
+        return GymConfiguration(self.barbells, self.dumbbell_pairs)
 
 
 class GymStock:
-    def balance_plates(self):
+    def balance_plates(self) -> List[GymConfiguration]:
         """
         Don't attempt to fudge balances, we can accept anything that balances, strict pairing is not a requirement.
         """
-        # How to order... Barbells first? Randomly until x configurations or t seconds are reached?
-        gym_iteration = GymIteration(self.weight_dict, self.barbells, self.dumbbells)
+        return SOLVER_ENGINES[self.engine](self.gym_iteration())
+
+    def gym_iteration(self) -> GymIteration:
+        return GymIteration(self.weight_dict, self.barbells, self.dumbbells)
+
+    def cross_check(self, other_engine: str) -> Tuple[Set[Tuple], Set[Tuple]]:
+        """Canonical configurations found only by our engine, and only by other_engine."""
+        if other_engine == self.engine:
+            raise ValueError("Cross checking engine {} against itself proves nothing.".format(other_engine))
+        ours = {configuration.canonical() for configuration in self.balance_plates()}
+        theirs = {configuration.canonical() for configuration in SOLVER_ENGINES[other_engine](self.gym_iteration())}
+        return ours - theirs, theirs - ours
 
     STD_DUMBBELL_THREAD_LEN = 100
     STD_BARBELL_THREAD_LEN = 300
@@ -89,6 +195,7 @@ class GymStock:
         self.barbells = int(barbells)
         self.dumbbells = int(dumbbells)
         self.weight_dict: Dict[Plate, int] = {}
+        self.engine = DEFAULT_ENGINE
 
     @staticmethod
     def validate_custom_weight(weight_metrics: str):
@@ -178,6 +285,233 @@ class GymStock:
             print("{} invalid quantity, try again.".format(count))
 
 
+SolverEngine = Callable[[GymIteration], List[GymConfiguration]]
+SOLVER_ENGINES: Dict[str, SolverEngine] = {}
+REFERENCE_ENGINE = "brute-force"
+DEFAULT_ENGINE = "counts"
+
+
+def register_engine(name: str) -> Callable[[SolverEngine], SolverEngine]:
+    def register(engine: SolverEngine) -> SolverEngine:
+        SOLVER_ENGINES[name] = engine
+        return engine
+    return register
+
+
+def distinct_configurations(canonicals: Set[Tuple]) -> List[GymConfiguration]:
+    return [GymConfiguration.from_canonical(canonical) for canonical in sorted(canonicals)]
+
+
+@register_engine(REFERENCE_ENGINE)
+def brute_force_engine(gym_iteration: GymIteration) -> List[GymConfiguration]:
+    """Tries every plate in the stack on every bar end. Far too slow for a real gym,
+    but simple enough to trust when checking the other engines."""
+    canonicals = set()
+    for iteration_number in range(gym_iteration.iteration_cnt()):
+        gym_iteration.nth_iteration(iteration_number)
+        configuration = gym_iteration.configuration()
+        if configuration.balances(GymStock.STD_BARBELL_THREAD_LEN, GymStock.STD_DUMBBELL_THREAD_LEN):
+            canonicals.add(configuration.canonical())
+    return distinct_configurations(canonicals)
+
+
+@register_engine(DEFAULT_ENGINE)
+def counts_engine(gym_iteration: GymIteration) -> List[GymConfiguration]:
+    """Loads bar ends with quantities of each plate type, rather than individual plates,
+    choosing only loadings weighing the same as the bar's first end."""
+    plate_list = sorted((plate for plate, qty in gym_iteration.plate_inventory.items() if qty), reverse=True)
+    inventory = [gym_iteration.plate_inventory[plate] for plate in plate_list]
+
+    def end_loadings(thread_len: int) -> Dict[float, List[Tuple[int, ...]]]:
+        loadings: Dict[float, List[Tuple[int, ...]]] = {}
+        for counts in itertools.product(*[range(qty + 1) for qty in inventory]):
+            if sum(plate.thickness * qty for plate, qty in zip(plate_list, counts)) <= thread_len:
+                weight = round(sum(plate.weight * qty for plate, qty in zip(plate_list, counts)), 6)
+                loadings.setdefault(weight, []).append(counts)
+        return loadings
+
+    # Each bar, or pair of dumbbells, has all its ends weigh the same.
+    bars = [(end_loadings(GymStock.STD_BARBELL_THREAD_LEN), 2)] * gym_iteration.barbell_cnt + \
+           [(end_loadings(GymStock.STD_DUMBBELL_THREAD_LEN), 4)] * (gym_iteration.dumbbell_cnt // 2)
+    canonicals = set()
+
+    def load(bar_index: int, end_index: int, ends: List[Tuple[int, ...]], remaining: List[int],
+             weight: Optional[float]):
+        if bar_index == len(bars):
+            sides = [[plate for plate, qty in zip(plate_list, counts) for _ in range(qty)] for counts in ends]
+            canonicals.add(GymConfiguration.from_sides(sides, gym_iteration.barbell_cnt).canonical())
+            return
+        loadings, end_cnt = bars[bar_index]
+        if end_index == end_cnt:
+            load(bar_index + 1, 0, ends, remaining, None)
+            return
+        weights = loadings if weight is None else [weight]
+        for w in weights:
+            for counts in loadings.get(w, []):
+                if all(qty <= left for qty, left in zip(counts, remaining)):
+                    ends.append(counts)
+                    load(bar_index, end_index + 1, ends, [left - qty for qty, left in zip(counts, remaining)], w)
+                    ends.pop()
+
+    load(0, 0, [], inventory, None)
+    return distinct_configurations(canonicals)
+
+
+# Binary result file layout, all little-endian:
+#   header: magic, format version, plate type count, barbell count, dumbbell count, record count
+#   plate table: weight (kg) and thickness (mm) of each plate type
+#   records: one fixed width record per configuration, holding for every bar end
+#            (see GymConfiguration.sides) a uint8 count of each plate type.
+RESULTS_MAGIC = b"TRUF"
+RESULTS_VERSION = 1
+RESULTS_HEADER = struct.Struct("<4sBBHHI")
+RESULTS_PLATE = struct.Struct("<dH")
+MAX_PLATES_PER_SIDE = 255
+
+
+def print_results(configurations: List[GymConfiguration], barbell_cnt: int, dumbbell_cnt: int) -> None:
+    """CSV of one configuration per row, with a column of plates for each bar end."""
+    header = []
+    for i in range(1, barbell_cnt + 1):
+        header.extend(["barbell{} lhs".format(i), "barbell{} rhs".format(i)])
+    for i in range(1, 2 * (dumbbell_cnt // 2) + 1):
+        header.extend(["dumbbell{} lhs".format(i), "dumbbell{} rhs".format(i)])
+    writer = csv.writer(sys.stdout)
+    writer.writerow(header)
+    for configuration in configurations:
+        writer.writerow(["+".join(map(str, side)) for side in configuration.sides()])
+
+
+def write_results(results_file: str, plate_list: List[Plate], barbell_cnt: int, dumbbell_cnt: int,
+                  configurations: List[GymConfiguration]) -> None:
+    """Packs configurations into the compact binary format read by ResultsReader.
+
+    Every configuration is packed before the file is opened so a ValueError never leaves it half written."""
+    if len(plate_list) > 255:
+        raise ValueError("At most 255 plate types can be recorded, not {}.".format(len(plate_list)))
+    if dumbbell_cnt % 2 != 0:
+        raise ValueError("Dumbbell count ({}) must be even!".format(dumbbell_cnt))
+    plate_index = {plate: i for i, plate in enumerate(plate_list)}
+    side_cnt = 2 * barbell_cnt + 2 * dumbbell_cnt
+    records = bytearray()
+    for configuration in configurations:
+        sides = configuration.sides()
+        if len(sides) != side_cnt:
+            raise ValueError("Configuration has {} bar ends, expected {}.".format(len(sides), side_cnt))
+        record = bytearray(side_cnt * len(plate_list))
+        for i, side in enumerate(sides):
+            for plate in side:
+                offset = i * len(plate_list) + plate_index[plate]
+                if record[offset] == MAX_PLATES_PER_SIDE:
+                    raise ValueError("More than {} of {} on one bar end.".format(MAX_PLATES_PER_SIDE, plate))
+                record[offset] += 1
+        records += record
+    try:
+        header = RESULTS_HEADER.pack(RESULTS_MAGIC, RESULTS_VERSION, len(plate_list), barbell_cnt, dumbbell_cnt,
+                                     len(configurations))
+        header += b"".join(RESULTS_PLATE.pack(plate.weight, plate.thickness) for plate in plate_list)
+    except struct.error as se:
+        raise ValueError("Bar counts or plate thicknesses too large for a results file: {}".format(se))
+    with open(results_file, "wb") as f:
+        f.write(header)
+        f.write(records)
+
+
+class ResultsReader:
+    """Memory maps a file written by write_results for random access to its configurations.
+
+    Bars are numbered barbells first, then individual dumbbells."""
+
+    def __init__(self, results_file: str):
+        with open(results_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size < RESULTS_HEADER.size:
+                raise ValueError("{} is too short to be a results file.".format(results_file))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, plate_cnt, self.barbell_cnt, self.dumbbell_cnt, self._record_cnt = \
+            RESULTS_HEADER.unpack_from(self._mmap)
+        if magic != RESULTS_MAGIC or version != RESULTS_VERSION or self.dumbbell_cnt % 2 != 0:
+            self.close()
+            raise ValueError("{} is not a version {} results file.".format(results_file, RESULTS_VERSION))
+        self._records_offset = RESULTS_HEADER.size + plate_cnt * RESULTS_PLATE.size
+        if len(self._mmap) < self._records_offset:
+            self.close()
+            raise ValueError("{} ends within its plate table.".format(results_file))
+        self.plate_list = [Plate(*RESULTS_PLATE.unpack_from(self._mmap, RESULTS_HEADER.size + i * RESULTS_PLATE.size))
+                           for i in range(plate_cnt)]
+        self.side_cnt = 2 * self.barbell_cnt + 2 * self.dumbbell_cnt
+        self.record_size = self.side_cnt * plate_cnt
+        if len(self._mmap) - self._records_offset != self._record_cnt * self.record_size:
+            self.close()
+            raise ValueError("{} should hold {} records of {} bytes.".format(
+                results_file, self._record_cnt, self.record_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+    def __len__(self):
+        return self._record_cnt
+
+    def record(self, n: int) -> memoryview:
+        """The raw plate type counts of the nth configuration, without copying them out of the file.
+
+        Release the returned view before closing the reader."""
+        if not 0 <= n < self._record_cnt:
+            raise IndexError("Record {} out of range for {} records.".format(n, self._record_cnt))
+        start = self._records_offset + n * self.record_size
+        return self._view[start:start + self.record_size]
+
+    def configuration(self, n: int) -> GymConfiguration:
+        record = self.record(n)
+        plate_cnt = len(self.plate_list)
+        sides = [[plate for plate, qty in zip(self.plate_list, record[i * plate_cnt:(i + 1) * plate_cnt])
+                  for _ in range(qty)]
+                 for i in range(self.side_cnt)]
+        return GymConfiguration.from_sides(sides, self.barbell_cnt)
+
+    def _bar_span(self, bar: int) -> Tuple[int, int]:
+        if not 0 <= bar < self.barbell_cnt + self.dumbbell_cnt:
+            raise IndexError("Bar {} out of range for {} bars.".format(bar, self.barbell_cnt + self.dumbbell_cnt))
+        span = 2 * len(self.plate_list)
+        return bar * span, (bar + 1) * span
+
+    def bar_weight(self, n: int, bar: int = 0) -> float:
+        """Total weight of the plates on both ends of a bar, not counting the bar itself,
+        in the nth configuration."""
+        start, stop = self._bar_span(bar)
+        weights = [plate.weight for plate in self.plate_list] * 2
+        return sum(w * qty for w, qty in zip(weights, self.record(n)[start:stop]))
+
+    def filter_by_bar_weight(self, weight: float, bar: int = 0) -> List[int]:
+        """Lists the indices of configurations loading one bar with the given total weight
+        of plates, not counting the bar itself.
+
+        struct unpacks just that bar's counts from each record, straight from the mapped file,
+        and the same loading recurs across many configurations so each is only summed once."""
+        start, stop = self._bar_span(bar)
+        if start == stop:
+            return list(range(self._record_cnt)) if math.isclose(0, weight) else []
+        weights = [plate.weight for plate in self.plate_list] * 2
+        bar_loading = struct.Struct("{}x{}B{}x".format(start, stop - start, self.record_size - stop))
+        matches: Dict[Tuple[int, ...], bool] = {}
+        indices = []
+        # Finished before returning, so no view of the file outlives the call to stop close().
+        with self._view[self._records_offset:] as records:
+            for n, loading in enumerate(bar_loading.iter_unpack(records)):
+                if loading not in matches:
+                    matches[loading] = math.isclose(sum(w * qty for w, qty in zip(weights, loading)), weight)
+                if matches[loading]:
+                    indices.append(n)
+        return indices
+
+
 def show_usage():
     my_name = os.path.split(sys.argv[0])[-1]
     print("This program presents configurations of your dumbbells and barbells.")
@@ -198,6 +532,14 @@ def show_usage():
           "  may be integers or multiplied by the plate capacity (mm) each side).\n"
           '    {"barbells": "1*350", "dumbbells": "2*120", "sizes": [\n'
           '      {"weight": 5, "thickness": 30, "quantity": 6}]}')
+    print("-o RESULTS_FILE may precede any of these to write the configurations in a\n"
+          "  compact binary format, instead of CSV, for ResultsReader to query later,\n"
+          "  such as by the weight of plates, excluding the bar, on any one bar.")
+    print("--engine NAME may precede any of these to choose how configurations are found,\n"
+          "  from {}. {} is the default.".format(", ".join(SOLVER_ENGINES), DEFAULT_ENGINE))
+    print("--cross-check compares the configurations from the engine against those\n"
+          "  of the slow but simple {} engine, instead of outputting them, so it cannot\n"
+          "  be combined with -o, nor with --engine {}.".format(REFERENCE_ENGINE, REFERENCE_ENGINE))
     print("2 arguments is interactive apart from the given BARBELLS and DUMBBELLS counts.\n"
           "Please ensure DUMBBELLS is even since this requirement helps clean the results.")
     print("Subsequent arguments must all be either integer quantities for the default \n"
@@ -241,11 +583,60 @@ def accept_inventory_file(args: List[str]) -> Optional[GymStock]:
             return gym_stock
 
 
-def parse_args(args: List[str]):
+def accept_results_file(args: List[str]) -> Tuple[Optional[str], List[str]]:
+    """Extracts "-o RESULTS_FILE" so that the remaining arguments parse as before."""
+    for i, elem in enumerate(args[:-1]):
+        if elem == "-o":
+            return args[i+1], args[:i] + args[i+2:]
+    return None, args
+
+
+def accept_engine_options(args: List[str]) -> Tuple[Optional[str], bool, List[str]]:
+    """Extracts "--engine NAME" and "--cross-check" so that the remaining arguments parse as before."""
+    cross_check = "--cross-check" in args
+    args = [elem for elem in args if elem != "--cross-check"]
+    for i, elem in enumerate(args[:-1]):
+        if elem == "--engine":
+            if args[i+1] not in SOLVER_ENGINES:
+                print("Unknown engine {}, choose from {}.".format(args[i+1], ", ".join(SOLVER_ENGINES)))
+                show_usage()
+            if cross_check and args[i+1] == REFERENCE_ENGINE:
+                print("The {} engine cannot be cross checked against itself.".format(REFERENCE_ENGINE))
+                show_usage()
+            return args[i+1], cross_check, args[:i] + args[i+2:]
+    return None, cross_check, args
+
+
+def report_cross_check(gym_stock: GymStock) -> None:
+    only_ours, only_reference = gym_stock.cross_check(REFERENCE_ENGINE)
+    for canonical in sorted(only_ours):
+        print("Only {}: {}".format(gym_stock.engine, GymConfiguration.from_canonical(canonical)))
+    for canonical in sorted(only_reference):
+        print("Only {}: {}".format(REFERENCE_ENGINE, GymConfiguration.from_canonical(canonical)))
+    if only_ours or only_reference:
+        raise SystemExit("Engines {} and {} disagree.".format(gym_stock.engine, REFERENCE_ENGINE))
+    print("Engines {} and {} agree.".format(gym_stock.engine, REFERENCE_ENGINE))
+
+
+def parse_args(args: List[str], results_file: Optional[str] = None, engine: Optional[str] = None,
+               cross_check: bool = False):
     gym_stock = accept_inventory_file(args)
     if gym_stock is None:
         gym_stock = parse_cmd_line_args(args)
-    gym_stock.balance_plates()
+    if engine is not None:
+        gym_stock.engine = engine
+    if cross_check:
+        report_cross_check(gym_stock)
+        return
+    configurations = gym_stock.balance_plates()
+    if results_file is None:
+        print_results(configurations, gym_stock.barbells, gym_stock.dumbbells)
+        return
+    try:
+        write_results(results_file, list(gym_stock.weight_dict), gym_stock.barbells, gym_stock.dumbbells,
+                      configurations)
+    except ValueError as ve:
+        raise SystemExit(ve)
 
 
 def parse_cmd_line_args(args: List[str]) -> GymStock:
@@ -302,7 +693,12 @@ def input_bar_specifier(item_name: str, default_bearing_mm: int) -> List[int]:
 
 
 def main():
-    parse_args(sys.argv[1:])
+    results_file, args = accept_results_file(sys.argv[1:])
+    engine, cross_check, args = accept_engine_options(args)
+    if cross_check and results_file is not None:
+        print("--cross-check writes no configurations, so cannot be combined with -o.")
+        show_usage()
+    parse_args(args, results_file, engine, cross_check)
 
 
 if __name__ == "__main__":